@@ -11,6 +11,7 @@ import re
 import shutil
 import subprocess
 import time
+import threading
 import requests
 import concurrent.futures
 from dataclasses import dataclass, field
@@ -181,23 +182,30 @@ def status(msg: str, level: str = "info") -> None:
 
 _SHELL_STREAM_STATE = {"buffer": "", "active": False, "header_sep": False, "last_line": "", "empty_streak": 0}
 _SHELL_BOX_WIDTH = 70
+# The box chrome never changes, so its colored strings are rendered once
+_SHELL_BOX_TOP = f"  {C.PURPLE}╭{'─' * _SHELL_BOX_WIDTH}╮{C.RST}"
+_SHELL_BOX_DIVIDER = f"  {C.PURPLE}├{'─' * _SHELL_BOX_WIDTH}┤{C.RST}"
+_SHELL_BOX_BOTTOM = f"  {C.PURPLE}╰{'─' * _SHELL_BOX_WIDTH}╯{C.RST}"
+_SHELL_BOX_EDGE = f"  {C.PURPLE}│{C.RST}"
 
 def _shell_box_top() -> None:
-    print(f"  {C.PURPLE}╭{'─' * _SHELL_BOX_WIDTH}╮{C.RST}")
+    print(_SHELL_BOX_TOP)
 
 def _shell_box_divider() -> None:
-    print(f"  {C.PURPLE}├{'─' * _SHELL_BOX_WIDTH}┤{C.RST}")
+    print(_SHELL_BOX_DIVIDER)
 
 def _shell_box_bottom() -> None:
-    print(f"  {C.PURPLE}╰{'─' * _SHELL_BOX_WIDTH}╯{C.RST}")
+    print(_SHELL_BOX_BOTTOM)
 
-def _shell_box_line(text: str = "", color: str = None) -> None:
+def _shell_box_text(text: str = "", color: str = None) -> str:
     if text == "":
-        print(f"  {C.PURPLE}│{C.RST}")
-        return
+        return _SHELL_BOX_EDGE
     if color:
         text = f"{color}{text}{C.RST}"
-    print(f"  {C.PURPLE}│{C.RST} {text}")
+    return f"{_SHELL_BOX_EDGE} {text}"
+
+def _shell_box_line(text: str = "", color: str = None) -> None:
+    print(_shell_box_text(text, color))
 
 def _shell_ensure_body() -> None:
     if _SHELL_STREAM_STATE.get("header_sep"):
@@ -242,16 +250,21 @@ def _shell_stream(event: str, text: Any = None) -> None:
         normalized = buf.replace("\r\n", "\n").replace("\r", "\n")
         lines = normalized.split("\n")
         _SHELL_STREAM_STATE["buffer"] = lines[-1]
-        for line in lines[:-1]:
+        if len(lines) > 1:
             _shell_ensure_body()
+        rows = []
+        for line in lines[:-1]:
             if line:
-                _shell_box_line(_style_shell_line(line))
+                rows.append(_shell_box_text(_style_shell_line(line)))
                 _SHELL_STREAM_STATE["last_line"] = line
                 _SHELL_STREAM_STATE["empty_streak"] = 0
             else:
                 if _SHELL_STREAM_STATE["empty_streak"] == 0:
-                    _shell_box_line()
+                    rows.append(_shell_box_text())
                 _SHELL_STREAM_STATE["empty_streak"] += 1
+        if rows:
+            # One write per output chunk instead of one per line
+            print("\n".join(rows))
         return
     if event == "pause":
         buf = _SHELL_STREAM_STATE.get("buffer", "")
@@ -395,9 +408,12 @@ def _get_openrouter_balance() -> Optional[str]:
         # Silently fail - balance is optional and shouldn't block commands
         return None
 
-def _build_prompt() -> str:
+@lru_cache(maxsize=1)
+def _prompt_user() -> str:
     import getpass
-    user = getpass.getuser()
+    return getpass.getuser()
+
+def _build_prompt() -> str:
     cwd = Path.cwd().name or "~"
     
     # Check if using local LLM
@@ -423,9 +439,17 @@ def _build_prompt() -> str:
         model_short = agent.model.split("/")[-1].split(":")[0] if agent else "local"
         balance_str = f"-[{C.BGREEN}⚡local:{model_short}{C.BPURPLE}]"
     
+    # Only cwd and the balance/model tag change between prompts; reuse the last render
+    key = (cwd, balance_str)
+    cached = getattr(_build_prompt, '_prompt_cache', None)
+    if cached and cached[0] == key:
+        return cached[1]
+    
+    user = _prompt_user()
     line1 = f"{C.BPURPLE}┌──({C.BRED}{user}{C.BPURPLE}@{C.BRED}supercoder{C.BPURPLE})-[{C.BOLD}{C.WHITE}{cwd}{C.RST}{C.BPURPLE}]{balance_str}{C.RST}"
     line2 = f"{C.BPURPLE}└─{C.BRED}${C.RST} "
-    return f"{line1}\n{line2}"
+    _build_prompt._prompt_cache = (key, f"{line1}\n{line2}")
+    return _build_prompt._prompt_cache[1]
 
 def get_input(prompt: str = None) -> str:
     try:
@@ -655,21 +679,29 @@ def _syntax_highlight(code: str, filename: str = "") -> str:
     except Exception:
         return code
 
-def _print_highlighted_lines(content: str, filename: str, prefix: str = "", line_nums: bool = True, color_override: str = None) -> None:
-    """Print content with syntax highlighting and optional line numbers."""
+def _highlighted_lines(content: str, filename: str, prefix: str = "", line_nums: bool = True, color_override: str = None) -> List[str]:
+    """Render content as boxed rows with syntax highlighting and optional line numbers."""
     if PYGMENTS_AVAILABLE and filename:
         highlighted = _syntax_highlight(content, filename)
         lines = highlighted.split('\n')
     else:
         lines = content.split('\n')
     
+    rows = []
     for i, line in enumerate(lines, 1):
         if color_override:
             line = f"{color_override}{line}{C.RST}"
         if line_nums:
-            print(f"  {C.PURPLE}│{C.RST} {prefix}{C.DIM}{i:4}{C.RST} {line}")
+            rows.append(f"{_TOOL_BOX_EDGE}{prefix}{C.DIM}{i:4}{C.RST} {line}")
         else:
-            print(f"  {C.PURPLE}│{C.RST} {prefix}{line}")
+            rows.append(f"{_TOOL_BOX_EDGE}{prefix}{line}")
+    return rows
+
+# Verbose tool box chrome, rendered once
+_TOOL_BOX_TOP = f"  {C.PURPLE}╭{'─' * 70}{C.RST}"
+_TOOL_BOX_SEP = f"  {C.PURPLE}├{'─' * 70}{C.RST}"
+_TOOL_BOX_BOTTOM = f"  {C.PURPLE}╰{'─' * 70}{C.RST}"
+_TOOL_BOX_EDGE = f"  {C.PURPLE}│{C.RST} "
 
 def print_tool(name: str, args: Dict[str, Any], result: str, compact: bool = True, verbose: bool = False) -> None:
     arg_str = ", ".join(f"{k}={repr(v)[:60]}" for k, v in args.items())
@@ -693,78 +725,76 @@ def print_tool(name: str, args: Dict[str, Any], result: str, compact: bool = Tru
         result = "\n".join(summary_lines)
     
     if verbose:
-        # Full verbose output with nice formatting (rounded corners)
-        print(f"  {C.PURPLE}╭{'─' * 70}{C.RST}")
+        # Full verbose output with nice formatting (rounded corners),
+        # collected into one list and written with a single print
+        out = [_TOOL_BOX_TOP]
         
         # Show full arguments for ALL operations
-        print(f"  {C.PURPLE}│{C.RST} {C.BYELLOW}TOOL:{C.RST} {name}")
-        print(f"  {C.PURPLE}│{C.RST} {C.BYELLOW}ARGUMENTS:{C.RST}")
+        out.append(f"{_TOOL_BOX_EDGE}{C.BYELLOW}TOOL:{C.RST} {name}")
+        out.append(f"{_TOOL_BOX_EDGE}{C.BYELLOW}ARGUMENTS:{C.RST}")
         for key, value in args.items():
             value_str = _to_str(value, join_lists=True)
             if len(value_str) > 100:
-                print(f"  {C.PURPLE}│{C.RST}   {C.CYAN}{key}:{C.RST} {value_str[:100]}... ({len(value_str)} chars)")
+                out.append(f"{_TOOL_BOX_EDGE}  {C.CYAN}{key}:{C.RST} {value_str[:100]}... ({len(value_str)} chars)")
             else:
-                print(f"  {C.PURPLE}│{C.RST}   {C.CYAN}{key}:{C.RST} {value_str}")
-        print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
+                out.append(f"{_TOOL_BOX_EDGE}  {C.CYAN}{key}:{C.RST} {value_str}")
+        out.append(_TOOL_BOX_SEP)
         
         # Show full content for write operations
         if name in ("fsWrite", "fsAppend"):
             content = _to_str(args.get("text", args.get("content", "")), join_lists=True)
             path = args.get("path", "")
-            print(f"  {C.PURPLE}│{C.RST} {C.BYELLOW}FILE CONTENT ({len(content)} chars):{C.RST}")
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
-            _print_highlighted_lines(content, path)
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
+            out.append(f"{_TOOL_BOX_EDGE}{C.BYELLOW}FILE CONTENT ({len(content)} chars):{C.RST}")
+            out.append(_TOOL_BOX_SEP)
+            out.extend(_highlighted_lines(content, path))
+            out.append(_TOOL_BOX_SEP)
         
         elif name == "strReplace":
             path = args.get("path", "")
             old = _to_str(args.get("old", args.get("oldStr", "")), join_lists=True)
             new = _to_str(args.get("new", args.get("newStr", "")), join_lists=True)
-            print(f"  {C.PURPLE}│{C.RST} {C.RED}OLD CONTENT ({len(old)} chars):{C.RST}")
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
-            _print_highlighted_lines(old, path, prefix=f"{C.RED}-{C.RST} ", line_nums=False)
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
-            print(f"  {C.PURPLE}│{C.RST} {C.GREEN}NEW CONTENT ({len(new)} chars):{C.RST}")
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
-            _print_highlighted_lines(new, path, prefix=f"{C.GREEN}+{C.RST} ", line_nums=False)
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
+            out.append(f"{_TOOL_BOX_EDGE}{C.RED}OLD CONTENT ({len(old)} chars):{C.RST}")
+            out.append(_TOOL_BOX_SEP)
+            out.extend(_highlighted_lines(old, path, prefix=f"{C.RED}-{C.RST} ", line_nums=False))
+            out.append(_TOOL_BOX_SEP)
+            out.append(f"{_TOOL_BOX_EDGE}{C.GREEN}NEW CONTENT ({len(new)} chars):{C.RST}")
+            out.append(_TOOL_BOX_SEP)
+            out.extend(_highlighted_lines(new, path, prefix=f"{C.GREEN}+{C.RST} ", line_nums=False))
+            out.append(_TOOL_BOX_SEP)
         
         elif name in ("readFile", "readCode", "readMultipleFiles"):
             path = args.get("path", args.get("paths", [""])[0] if args.get("paths") else "")
-            print(f"  {C.PURPLE}│{C.RST} {C.BYELLOW}FILE CONTENT:{C.RST}")
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
-            _print_highlighted_lines(result, path)
-            print(f"  {C.PURPLE}├{'─' * 70}{C.RST}")
+            out.append(f"{_TOOL_BOX_EDGE}{C.BYELLOW}FILE CONTENT:{C.RST}")
+            out.append(_TOOL_BOX_SEP)
+            out.extend(_highlighted_lines(result, path))
+            out.append(_TOOL_BOX_SEP)
         
         # Always show result for all tools
         if result:
-            print(f"  {C.PURPLE}│{C.RST} {C.BYELLOW}RESULT:{C.RST}")
-            # For very long results, show with syntax highlighting if it looks like code
-            if len(result) > 500 and name in ("readFile", "readCode", "readMultipleFiles", "executePwsh", "grepSearch"):
-                for line in result.split('\n'):
-                    print(f"  {C.PURPLE}│{C.RST} {line}")
-            else:
-                for line in result.split('\n'):
-                    print(f"  {C.PURPLE}│{C.RST} {line}")
+            out.append(f"{_TOOL_BOX_EDGE}{C.BYELLOW}RESULT:{C.RST}")
+            out.extend(f"{_TOOL_BOX_EDGE}{line}" for line in result.split('\n'))
         
-        print(f"  {C.PURPLE}╰{'─' * 70}{C.RST}")
+        out.append(_TOOL_BOX_BOTTOM)
+        print("\n".join(out))
     
     elif not compact:
         # Non-compact but not verbose - show more but not everything
         if result:
-            for line in result.split('\n')[:50]:
+            lines = result.split('\n')
+            for line in lines[:50]:
                 print(f"    {C.GRAY}{line[:300]}{C.RST}")
-            if len(result.split('\n')) > 50:
-                print(f"    {C.GRAY}... ({len(result.split(chr(10))) - 50} more lines){C.RST}")
+            if len(lines) > 50:
+                print(f"    {C.GRAY}... ({len(lines) - 50} more lines){C.RST}")
     
     else:
         # Compact mode - minimal output
         if result:
             display = compress_console(result, 2000)
-            for line in display.split('\n')[:15]:
+            lines = display.split('\n')
+            for line in lines[:15]:
                 print(f"    {C.GRAY}{line[:150]}{C.RST}")
-            if len(display.split('\n')) > 15:
-                print(f"    {C.GRAY}... ({len(display.split(chr(10))) - 15} more lines){C.RST}")
+            if len(lines) > 15:
+                print(f"    {C.GRAY}... ({len(lines) - 15} more lines){C.RST}")
 
 
 def _print_completion_box(summary: str, success: bool = True) -> None:
@@ -1314,6 +1344,7 @@ def cmd_vision(state: State, agent: Agent, args: str) -> None:
         if result['mode'] == 'local':
             status(f"Model: Qwen3-VL-{result['local_model'].upper()}-Instruct", "info")
             status(f"Loaded: {result['local_model_loaded']}", "info")
+            status(f"Quantization: {result.get('quantization', 'none')}", "info")
             if result.get('dependencies_installed'):
                 status(f"CUDA Available: {result.get('cuda_available', False)}", "info")
                 if result.get('cuda_available'):
@@ -1330,9 +1361,10 @@ def cmd_vision(state: State, agent: Agent, args: str) -> None:
     parts = args.split()
     
     if parts[0] == "local":
-        # vision local 2b/4b/8b/32b
+        # vision local 2b/4b/8b/32b [none/fp8/int4/int4-unsloth]
         model_size = parts[1] if len(parts) > 1 else "2b"
-        result = vision_tools.vision_set_mode("local", model_size)
+        quantization = parts[2] if len(parts) > 2 else "none"
+        result = vision_tools.vision_set_mode("local", model_size, quantization)
         
         if "error" in result:
             status(result["error"], "error")
@@ -1353,12 +1385,13 @@ def cmd_vision(state: State, agent: Agent, args: str) -> None:
                 status(result["note"], "info")
     
     else:
-        status("Usage: vision [local 2b/4b/8b/32b | api | status]", "error")
+        status("Usage: vision [local 2b/4b/8b/32b [fp8/int4/int4-unsloth] | api | status]", "error")
         status("Examples:", "info")
         status("  vision local 2b    - Use local Qwen3-VL 2B model", "info")
         status("  vision local 4b    - Use local Qwen3-VL 4B model", "info")
         status("  vision local 8b    - Use local Qwen3-VL 8B model", "info")
         status("  vision local 32b   - Use local Qwen3-VL 32B model", "info")
+        status("  vision local 8b int4 - Use local Qwen3-VL 8B model quantized to 4-bit", "info")
         status("  vision api         - Use OpenRouter API", "info")
         status("  vision status      - Show current configuration", "info")
 
@@ -1392,6 +1425,7 @@ def cmd_tokens(state: State, agent: Agent, args: str) -> None:
             tokens_path.unlink()
             TokenManager._tokens = None
             TokenManager._current_index = 0
+            tools.image_invalidate_token_cache()
         status("Tokens cleared", "success")
         return
     print(f"  {C.GRAY}╭─ Enter API tokens (one per line, empty line to finish){C.RST}")
@@ -1412,6 +1446,7 @@ def cmd_tokens(state: State, agent: Agent, args: str) -> None:
     TokenManager._tokens = None
     TokenManager._current_index = 0
     TokenManager.load_tokens()
+    tools.image_invalidate_token_cache()
     status(f"Saved {len(new_tokens)} token(s) globally", "success")
 
 @cmd("quit", "Exit supercoder", shortcuts=["exit", "q"])
@@ -1818,6 +1853,13 @@ def run(agent: Agent, state: State) -> None:
                 
                 _stream_chars = [0]
                 _has_content = [False]
+                _last_flush = [0.0]
+                _flush_timer = [None]
+
+                def _trailing_flush():
+                    _flush_timer[0] = None
+                    _last_flush[0] = time.monotonic()
+                    sys.stdout.flush()
 
                 sys.stdout.write(f'\r  {C.DIM}thinking...{C.RST}')
                 sys.stdout.flush()
@@ -1828,9 +1870,22 @@ def run(agent: Agent, state: State) -> None:
                         if not _has_content[0]:
                             sys.stdout.write('\r' + ' ' * 40 + '\r')
                             _has_content[0] = True
-                        print(f"{C.WHITE}{chunk}{C.RST}", end='', flush=True)
+                        sys.stdout.write(f"{C.WHITE}{chunk}{C.RST}")
+                        # Chunks arrive far faster than the screen refreshes; flush at most ~60x/s
+                        now = time.monotonic()
+                        if now - _last_flush[0] >= 0.016:
+                            sys.stdout.flush()
+                            _last_flush[0] = now
+                        elif _flush_timer[0] is None:
+                            # Flush the tail even if the model pauses here (before tool calls, between frames)
+                            _flush_timer[0] = threading.Timer(0.016, _trailing_flush)
+                            _flush_timer[0].daemon = True
+                            _flush_timer[0].start()
 
                 content, tool_calls = agent.PromptWithTools(full_prompt, streaming=True, on_chunk=on_chunk)
+                if _flush_timer[0] is not None:
+                    _flush_timer[0].cancel()
+                sys.stdout.flush()
                 had_content = bool(content)
 
                 if not _has_content[0]:
@@ -2,66 +2,243 @@
 Vision Tools for SuperCoder - UI Analysis with Qwen3-VL
 Supports both local models (2B, 4B, 8B, 32B) and OpenRouter API
 """
+import io
 import os
+import re
 import json
+import hashlib
+import time
+import importlib.util
 import base64
+import atexit
+import threading
 import requests
 from pathlib import Path
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Tuple
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
-# Vision model configuration
-_vision_config = {
-    "mode": "api",  # "local" or "api"
-    "local_model": "2b",  # "2b", "4b", "8b", "32b"
-    "local_model_loaded": False,
-    "model_instance": None,
-    "processor_instance": None,
-    "device": None
+# pybase64 uses a SIMD encoder; fall back to the stdlib when not installed
+try:
+    import pybase64 as _base64
+    PYBASE64_AVAILABLE = True
+except ImportError:
+    _base64 = base64
+    PYBASE64_AVAILABLE = False
+
+_PNG_DATA_URL_PREFIX = b"data:image/png;base64,"
+_JPEG_DATA_URL_PREFIX = b"data:image/jpeg;base64,"
+_B64_READ_CHUNK = 3 << 22  # 12 MB; a multiple of 3 so chunks encode without padding
+
+# Screenshots sent to the API are downscaled to this long edge and re-encoded
+# as JPEG; UI analysis doesn't need more, and it cuts upload size 5-20x
+_API_IMAGE_MAX_EDGE = 1280
+_API_JPEG_QUALITY = 85
+
+class _VisionState:
+    """Vision model configuration; slotted so hot-path field reads skip a dict lookup"""
+    __slots__ = (
+        "mode", "local_model", "local_model_loaded", "model_instance",
+        "processor_instance", "device", "compiled", "quantization",
+        "preferred_api_model"
+    )
+    
+    def __init__(self):
+        self.mode = "api"  # "local" or "api"
+        self.local_model = "2b"  # "2b", "4b", "8b", "32b"
+        self.local_model_loaded = False
+        self.model_instance = None
+        self.processor_instance = None
+        self.device = None
+        self.compiled = False
+        self.quantization = "none"  # "none", "fp8", "int4", "int4-unsloth"
+        self.preferred_api_model = None  # fastest live route, set by the first API call
+
+
+# Vision model configuration (mutated in place, never rebound)
+_vision_config = _VisionState()
+
+_QUANTIZATION_MODES = ["none", "fp8", "int4", "int4-unsloth"]
+
+# Generation caps per task. Decode time is linear in tokens generated, and the
+# short structured answers (find/verify) never need the full 512.
+_MAX_NEW_TOKENS = {
+    "analyze_ui": 512,
+    "find_element": 128,
+    "verify_layout": 256,
+    "accessibility": 384,
+    "compare": 512
 }
 
-def vision_set_mode(mode: str, model_size: str = "2b") -> Dict[str, Any]:
+# Serializes model load/unload; a duplicate load of a 15 GB model would OOM
+_load_lock = threading.Lock()
+
+_OPENROUTER_CHAT_URL = "https://openrouter.ai/api/v1/chat/completions"
+
+# OpenRouter Qwen VL routes, all far cheaper than GPT-4V / Claude Opus. List
+# order is only a tie-break until the first probe picks the fastest one.
+_API_VISION_MODELS = [
+    "qwen/qwen-2-vl-72b-instruct",
+    "qwen/qwen2.5-vl-72b-instruct",
+    "qwen/qwen2.5-vl-32b-instruct"
+]
+_API_TIMEOUT = (5, 45)  # (connect, read): fail fast on DNS/TLS
+_API_PROBE_TIMEOUT = (5, 15)
+_PROBE_RETRY_AFTER = 300  # seconds to skip probing after every probe failed
+_probe_lock = threading.Lock()
+_probe_future = None  # Future of the probe round in flight, if any
+_probe_failed_at = float("-inf")
+
+# Analysis results, LRU keyed on (image content digest, prompt, token cap,
+# mode, model size, quantization). Only successful results are stored.
+_result_cache: "OrderedDict[Tuple[bytes, str, int, str, str, str], Dict[str, Any]]" = OrderedDict()
+_RESULT_CACHE_MAX = 256
+_result_cache_lock = threading.Lock()
+
+# Shared keep-alive session so repeated analyses (and model fallbacks) reuse
+# one TLS connection to OpenRouter instead of handshaking per request.
+_http = None
+_http_lock = threading.Lock()
+
+# Pinned host buffer reused for pixel_values uploads (see _pinned_pixel_copy)
+_pinned_staging = None
+_pinned_staging_event = None
+_pinned_staging_lock = threading.Lock()
+
+# One pass over a model's UI analysis: each line is an issue heading, a
+# suggestion heading or a bullet, checked in that order
+_UI_SECTION_RE = re.compile(
+    r"^[^\S\n]*(?:"
+    r"(?P<issue>.*(?:issue|problem).*)"
+    r"|(?P<suggest>.*(?:suggest|recommend).*)"
+    r"|[-•*](?P<item>.*)"
+    r")$",
+    re.IGNORECASE | re.MULTILINE
+)
+
+# Prompt lengths are left-padded up to one of these when the model is compiled,
+# so torch.compile reuses a handful of graphs instead of recompiling per shape
+_SEQ_BUCKETS = (512, 1024, 2048, 4096, 8192)
+
+# Static KV cache length for the compiled model. One size for every bucket and
+# task cap, so the cache (and the graphs built around it) never changes shape;
+# per-task caps are enforced by a stopping criterion instead.
+_STATIC_CACHE_LEN = _SEQ_BUCKETS[-1] + max(_MAX_NEW_TOKENS.values())
+
+# Modules left at full precision when quantizing: the vision encoder loses
+# noticeable accuracy on UI screenshots, and lm_head is cheap to keep.
+_QUANT_SKIP_MODULES = ["visual", "lm_head"]
+
+@lru_cache(maxsize=64)
+def _file_digest(image_path: str, mtime_ns: int, size: int) -> bytes:
+    """BLAKE2b digest of a file's contents; memoized per (path, mtime, size)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.digest()
+
+
+def _image_digest(image_path: str) -> bytes:
+    st = os.stat(image_path)
+    return _file_digest(os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
+
+
+def _result_cache_key(image_path: str, prompt: str, max_new_tokens: int) -> Tuple[bytes, str, int, str, str, str]:
+    return (
+        _image_digest(image_path),
+        prompt,
+        max_new_tokens,
+        _vision_config.mode,
+        _vision_config.local_model,
+        _vision_config.quantization
+    )
+
+
+def _result_cache_get(key) -> Optional[Dict[str, Any]]:
+    with _result_cache_lock:
+        result = _result_cache.get(key)
+        if result is None:
+            return None
+        _result_cache.move_to_end(key)
+    return {**result, "cached": True}
+
+
+def _result_cache_put(key, result: Dict[str, Any]) -> None:
+    if "error" in result:
+        return
+    with _result_cache_lock:
+        _result_cache[key] = result
+        _result_cache.move_to_end(key)
+        if len(_result_cache) > _RESULT_CACHE_MAX:
+            _result_cache.popitem(last=False)
+
+
+def _get_http() -> requests.Session:
+    """Lazily create the shared OpenRouter session."""
+    global _http
+    with _http_lock:
+        if _http is None:
+            session = requests.Session()
+            session.headers.update({"Content-Type": "application/json"})
+            atexit.register(session.close)
+            _http = session
+        return _http
+
+
+def vision_set_mode(mode: str, model_size: str = "2b", quantization: str = "none") -> Dict[str, Any]:
     """
     Set vision model mode and size.
     
     Args:
         mode: "local" or "api"
         model_size: For local mode: "2b", "4b", "8b", "32b"
+        quantization: For local mode: "none", "fp8", "int4", "int4-unsloth"
     
     Returns:
         Configuration status
     """
-    global _vision_config
-    
     if mode not in ["local", "api"]:
         return {"error": f"Invalid mode: {mode}. Use 'local' or 'api'"}
     
     if mode == "local":
         if model_size not in ["2b", "4b", "8b", "32b"]:
             return {"error": f"Invalid model_size: {model_size}. Use '2b', '4b', '8b', or '32b'"}
+        if quantization not in _QUANTIZATION_MODES:
+            return {"error": f"Invalid quantization: {quantization}. Use 'none', 'fp8', 'int4', or 'int4-unsloth'"}
         
-        _vision_config["mode"] = "local"
-        _vision_config["local_model"] = model_size
-        _vision_config["local_model_loaded"] = False
+        with _load_lock:
+            _vision_config.mode = "local"
+            _vision_config.local_model = model_size
+            _vision_config.quantization = quantization
+            _vision_config.local_model_loaded = False
+            # Drop any previous model now so the next load doesn't hold both
+            _vision_config.model_instance = None
+            _vision_config.processor_instance = None
         
+        suffix = "" if quantization == "none" else f" ({quantization})"
         return {
             "mode": "local",
             "model_size": model_size,
-            "message": f"Vision mode set to local Qwen3-VL-{model_size.upper()}",
+            "quantization": quantization,
+            "message": f"Vision mode set to local Qwen3-VL-{model_size.upper()}{suffix}",
             "note": "Model will be downloaded on first use (~2-15GB depending on size)"
         }
     
     else:  # api mode
-        _vision_config["mode"] = "api"
-        _vision_config["local_model_loaded"] = False
-        
-        # Unload local model if loaded
-        if _vision_config["model_instance"] is not None:
-            _vision_config["model_instance"] = None
-            _vision_config["processor_instance"] = None
-            import torch
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
+        with _load_lock:
+            _vision_config.mode = "api"
+            _vision_config.local_model_loaded = False
+            
+            # Unload local model if loaded
+            if _vision_config.model_instance is not None:
+                _vision_config.model_instance = None
+                _vision_config.processor_instance = None
+                import torch
+                if torch.cuda.is_available():
+                    torch.cuda.empty_cache()
         
         return {
             "mode": "api",
@@ -77,17 +254,16 @@ def vision_get_status() -> Dict[str, Any]:
     Returns:
         Current configuration and model info
     """
-    global _vision_config
-    
     status = {
-        "mode": _vision_config["mode"],
-        "local_model": _vision_config["local_model"],
-        "local_model_loaded": _vision_config["local_model_loaded"]
+        "mode": _vision_config.mode,
+        "local_model": _vision_config.local_model,
+        "local_model_loaded": _vision_config.local_model_loaded,
+        "quantization": _vision_config.quantization
     }
     
-    if _vision_config["mode"] == "local":
-        status["model_name"] = f"Qwen3-VL-{_vision_config['local_model'].upper()}-Instruct"
-        status["device"] = str(_vision_config.get("device", "Not loaded"))
+    if _vision_config.mode == "local":
+        status["model_name"] = f"Qwen3-VL-{_vision_config.local_model.upper()}-Instruct"
+        status["device"] = str(_vision_config.device)
         
         # Check if dependencies are installed
         try:
@@ -104,6 +280,7 @@ def vision_get_status() -> Dict[str, Any]:
     
     else:  # api mode
         status["api_endpoint"] = "OpenRouter (Qwen3-VL)"
+        status["api_model"] = _vision_config.preferred_api_model or "Not probed yet"
         status["cost_per_image"] = "~$0.01-0.03"
     
     return status
@@ -111,9 +288,7 @@ def vision_get_status() -> Dict[str, Any]:
 
 def _load_local_model() -> Dict[str, Any]:
     """Load local Qwen3-VL model"""
-    global _vision_config
-    
-    if _vision_config["local_model_loaded"]:
+    if _vision_config.local_model_loaded:
         return {"success": True, "message": "Model already loaded"}
     
     try:
@@ -121,39 +296,109 @@ def _load_local_model() -> Dict[str, Any]:
         from transformers import Qwen2VLForConditionalGeneration, AutoProcessor
         from qwen_vl_utils import process_vision_info
         
-        model_size = _vision_config["local_model"]
+        model_size = _vision_config.local_model
         model_name = f"Qwen/Qwen2-VL-{model_size.upper()}-Instruct"
-        
-        print(f"[Loading Qwen3-VL-{model_size.upper()} model... This may take a few minutes on first run]")
+        quantization = _vision_config.quantization
         
         # Determine device
         device = "cuda" if torch.cuda.is_available() else "cpu"
-        _vision_config["device"] = device
+        
+        if quantization != "none" and device != "cuda":
+            return {
+                "error": f"Quantization '{quantization}' requires a CUDA GPU",
+                "suggestion": "Use quantization 'none' on CPU"
+            }
+        
+        print(f"[Loading Qwen3-VL-{model_size.upper()} model... This may take a few minutes on first run]")
+        _vision_config.device = device
+        
+        load_kwargs = {}
+        if quantization == "int4":
+            from transformers import BitsAndBytesConfig
+            load_kwargs["quantization_config"] = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16,
+                bnb_4bit_use_double_quant=True,
+                llm_int8_skip_modules=_QUANT_SKIP_MODULES
+            )
+        elif quantization == "int4-unsloth":
+            # Pre-quantized NF4 checkpoint; no on-the-fly quantization at load
+            model_name = f"unsloth/Qwen2-VL-{model_size.upper()}-Instruct-bnb-4bit"
+        elif quantization == "fp8":
+            from transformers import FbgemmFp8Config
+            load_kwargs["quantization_config"] = FbgemmFp8Config(
+                modules_to_not_convert=_QUANT_SKIP_MODULES
+            )
+        
+        # Fused attention: FlashAttention-2 when installed on GPU, else PyTorch SDPA
+        if device == "cuda" and importlib.util.find_spec("flash_attn") is not None:
+            attn_implementation = "flash_attention_2"
+        else:
+            attn_implementation = "sdpa"
         
         # Load model
         model = Qwen2VLForConditionalGeneration.from_pretrained(
             model_name,
             torch_dtype=torch.float16 if device == "cuda" else torch.float32,
-            device_map="auto" if device == "cuda" else None
+            device_map="auto" if device == "cuda" else None,
+            attn_implementation=attn_implementation,
+            **load_kwargs
         )
         
-        # Load processor
-        processor = AutoProcessor.from_pretrained(model_name)
+        model.eval()
+        model.generation_config.use_cache = True
+        
+        # Compile the forward pass with a static KV cache so decode steps replay
+        # CUDA graphs. Needs Triton; bitsandbytes layers don't compile cleanly.
+        # Compilation itself happens on the first generate, which falls back
+        # to eager if it fails (see _generate_batch_with_local_model).
+        compiled = False
+        if (device == "cuda" and quantization == "none"
+                and importlib.util.find_spec("triton") is not None):
+            try:
+                model.generation_config.cache_implementation = "static"
+                model.forward = torch.compile(model.forward, mode="reduce-overhead")
+                compiled = True
+            except Exception:
+                model.__dict__.pop("forward", None)
+                model.generation_config.cache_implementation = None
+        
+        # Load processor; left padding so batched prompts generate correctly
+        processor = AutoProcessor.from_pretrained(model_name, use_fast=True)
+        processor.tokenizer.padding_side = "left"
+        if not type(processor.image_processor).__name__.endswith("Fast"):
+            # Older transformers ignore use_fast for the image processor
+            try:
+                from transformers import Qwen2VLImageProcessorFast
+                processor.image_processor = Qwen2VLImageProcessorFast.from_pretrained(model_name)
+            except ImportError:
+                pass
         
-        _vision_config["model_instance"] = model
-        _vision_config["processor_instance"] = processor
-        _vision_config["local_model_loaded"] = True
+        _vision_config.model_instance = model
+        _vision_config.processor_instance = processor
+        _chat_text.cache_clear()
+        _vision_config.compiled = compiled
+        _vision_config.local_model_loaded = True
         
         return {
             "success": True,
             "model": model_name,
             "device": device,
+            "quantization": quantization,
+            "attention": attn_implementation,
+            "compiled": compiled,
             "message": f"Qwen3-VL-{model_size.upper()} loaded successfully on {device}"
         }
     
     except ImportError as e:
+        packages = "torch transformers qwen-vl-utils"
+        if _vision_config.quantization in ("int4", "int4-unsloth"):
+            packages += " bitsandbytes"
+        elif _vision_config.quantization == "fp8":
+            packages += " fbgemm-gpu"
         return {
-            "error": "Missing dependencies. Install with: pip install torch transformers qwen-vl-utils",
+            "error": f"Missing dependencies. Install with: pip install {packages}",
             "details": str(e)
         }
     except Exception as e:
@@ -163,102 +408,428 @@ def _load_local_model() -> Dict[str, Any]:
         }
 
 
-def _analyze_with_local_model(image_path: str, prompt: str) -> Dict[str, Any]:
-    """Analyze image with local Qwen3-VL model"""
-    global _vision_config
+@lru_cache(maxsize=128)
+def _chat_text(prompt: str) -> str:
+    """
+    Chat-templated text for one image plus prompt.
+    
+    The template renders the image as a fixed placeholder, so the result only
+    depends on the prompt; the fixed tool prompts are rendered once. Cleared
+    whenever a new processor is loaded.
+    """
+    messages = [
+        {
+            "role": "user",
+            "content": [
+                {"type": "image"},
+                {"type": "text", "text": prompt}
+            ]
+        }
+    ]
+    return _vision_config.processor_instance.apply_chat_template(
+        messages, tokenize=False, add_generation_prompt=True
+    )
+
+
+def _pad_to_bucket(inputs, pad_token_id: int) -> None:
+    """Left-pad input_ids/attention_mask in place up to the next _SEQ_BUCKETS size"""
+    import torch.nn.functional as F
+    
+    length = inputs["input_ids"].shape[1]
+    bucket = next((b for b in _SEQ_BUCKETS if b >= length), length)
+    if bucket > length:
+        pad = (bucket - length, 0)
+        inputs["input_ids"] = F.pad(inputs["input_ids"], pad, value=pad_token_id)
+        inputs["attention_mask"] = F.pad(inputs["attention_mask"], pad, value=0)
+
+
+def _pinned_pixel_copy(pixel_values, device):
+    """
+    Copy pixel_values to the GPU through a reusable pinned staging buffer.
+    
+    The buffer grows to the largest screenshot seen. A CUDA event marks when
+    the previous async copy out of it finished, so it isn't overwritten early.
+    """
+    import torch
+    global _pinned_staging, _pinned_staging_event
+    
+    with _pinned_staging_lock:
+        if _pinned_staging_event is not None:
+            _pinned_staging_event.synchronize()
+        numel = pixel_values.numel()
+        if (_pinned_staging is None or _pinned_staging.dtype != pixel_values.dtype
+                or _pinned_staging.numel() < numel):
+            _pinned_staging = torch.empty(numel, dtype=pixel_values.dtype, pin_memory=True)
+        
+        staging = _pinned_staging[:numel].view(pixel_values.shape)
+        staging.copy_(pixel_values)
+        on_device = staging.to(device, non_blocking=True)
+        _pinned_staging_event = torch.cuda.Event()
+        _pinned_staging_event.record()
+    return on_device
+
+
+def _inputs_to_device(inputs, device) -> Dict[str, Any]:
+    """Move processor outputs to device; on CUDA via pinned memory, asynchronously"""
+    import torch
     
-    # Load model if not loaded
-    if not _vision_config["local_model_loaded"]:
-        load_result = _load_local_model()
-        if "error" in load_result:
-            return load_result
+    if device != "cuda":
+        return {k: v.to(device) if torch.is_tensor(v) else v for k, v in inputs.items()}
     
+    device_inputs = {}
+    for k, v in inputs.items():
+        if not torch.is_tensor(v):
+            device_inputs[k] = v
+        elif k == "pixel_values":
+            device_inputs[k] = _pinned_pixel_copy(v, device)
+        else:
+            device_inputs[k] = v.pin_memory().to(device, non_blocking=True)
+    return device_inputs
+
+
+def _disable_compile(model) -> None:
+    """Fall back to the eager forward and dynamic KV cache after a compile failure"""
+    model.__dict__.pop("forward", None)
+    model.generation_config.cache_implementation = None
+    _vision_config.compiled = False
+
+
+def _generate_new_tokens(model, inputs, device, max_new_tokens: int, compiled: bool = False):
+    """
+    Run generate on device and return only the generated tokens, on CPU.
+    
+    Device copies of the inputs (pixel_values can be tens of MB) and the full
+    output sequence live only inside this call, so nothing keeps them on the GPU
+    once decoding starts.
+    """
+    import torch
+    
+    # Generate without autograd/version-counter tracking
+    with torch.inference_mode():
+        device_inputs = _inputs_to_device(inputs, device)
+        prompt_len = device_inputs["input_ids"].shape[1]
+        if compiled:
+            # The static cache is sized from max_length, so keep that fixed and
+            # stop at the task's cap with a criterion instead
+            from transformers import StoppingCriteria, StoppingCriteriaList
+            
+            stop_at = prompt_len + max_new_tokens
+            
+            class _NewTokenLimit(StoppingCriteria):
+                def __call__(self, input_ids, scores, **kwargs):
+                    return torch.full((input_ids.shape[0],), input_ids.shape[-1] >= stop_at,
+                                      dtype=torch.bool, device=input_ids.device)
+            
+            length_kwargs = {
+                "max_new_tokens": None,
+                "max_length": max(_STATIC_CACHE_LEN, stop_at),
+                "stopping_criteria": StoppingCriteriaList([_NewTokenLimit()])
+            }
+        else:
+            length_kwargs = {"max_new_tokens": max_new_tokens}
+        # Greedy decoding: these are structured-extraction tasks
+        generated_ids = model.generate(
+            **device_inputs,
+            **length_kwargs,
+            do_sample=False,
+            num_beams=1
+        )
+        del device_inputs
+        # Rows are padded to a common length, so one slice trims every prompt
+        new_tokens = generated_ids[:, prompt_len:].cpu()
+        del generated_ids
+    return new_tokens
+
+
+def _analyze_batch_with_local_model(image_paths: List[str], prompts: List[str],
+                                    max_new_tokens: int = 512) -> List[Dict[str, Any]]:
+    """Analyze (image, prompt) pairs with local Qwen3-VL model, serving repeats from cache"""
     try:
-        import torch
+        keys = [_result_cache_key(path, prompt, max_new_tokens) for path, prompt in zip(image_paths, prompts)]
+    except OSError as e:
+        return [{"error": f"Local model analysis failed: {str(e)}"}] * len(prompts)
+    
+    results = [_result_cache_get(key) for key in keys]
+    misses = [i for i, result in enumerate(results) if result is None]
+    if misses:
+        fresh = _generate_batch_with_local_model(
+            [image_paths[i] for i in misses], [prompts[i] for i in misses], max_new_tokens
+        )
+        for i, result in zip(misses, fresh):
+            _result_cache_put(keys[i], result)
+            results[i] = result
+    return results
+
+
+def _generate_batch_with_local_model(image_paths: List[str], prompts: List[str],
+                                     max_new_tokens: int) -> List[Dict[str, Any]]:
+    """Analyze (image, prompt) pairs with local Qwen3-VL model in one generate call"""
+    # Load model if not loaded; double-checked so concurrent first calls load it once
+    if not _vision_config.local_model_loaded:
+        with _load_lock:
+            if not _vision_config.local_model_loaded:
+                load_result = _load_local_model()
+                if "error" in load_result:
+                    return [load_result] * len(prompts)
+    
+    try:
+        from PIL import Image
         from qwen_vl_utils import process_vision_info
         
-        model = _vision_config["model_instance"]
-        processor = _vision_config["processor_instance"]
+        model = _vision_config.model_instance
+        processor = _vision_config.processor_instance
         
-        # Prepare messages
-        messages = [
-            {
-                "role": "user",
-                "content": [
-                    {"type": "image", "image": f"file://{Path(image_path).absolute()}"},
-                    {"type": "text", "text": prompt}
-                ]
-            }
+        # Decode each distinct image once, even when several prompts share it,
+        # and hand the PIL image over directly instead of a file:// URL
+        pil_by_path = {}
+        for image_path in dict.fromkeys(image_paths):
+            with Image.open(image_path) as img:
+                pil_by_path[image_path] = img.convert("RGB")
+        
+        # Prepare one conversation per (image, prompt) pair
+        messages_list = [
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {"type": "image", "image": pil_by_path[image_path]},
+                        {"type": "text", "text": prompt}
+                    ]
+                }
+            ]
+            for image_path, prompt in zip(image_paths, prompts)
         ]
         
+        # Resize to the model's pixel budget, again once per distinct image
+        unique_paths = list(pil_by_path)
+        first_use = [image_paths.index(path) for path in unique_paths]
+        resized, _ = process_vision_info([messages_list[i] for i in first_use])
+        image_by_path = dict(zip(unique_paths, resized))
+        image_inputs = [image_by_path[path] for path in image_paths]
+        
         # Process
-        text = processor.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
-        image_inputs, video_inputs = process_vision_info(messages)
+        texts = [_chat_text(prompt) for prompt in prompts]
         
         inputs = processor(
-            text=[text],
+            text=texts,
             images=image_inputs,
-            videos=video_inputs,
             padding=True,
             return_tensors="pt"
         )
+        if _vision_config.compiled:
+            _pad_to_bucket(inputs, processor.tokenizer.pad_token_id)
         
-        # Move to device
-        inputs = inputs.to(_vision_config["device"])
-        
-        # Generate
-        with torch.no_grad():
-            generated_ids = model.generate(**inputs, max_new_tokens=512)
-        
-        # Trim input tokens
-        generated_ids_trimmed = [
-            out_ids[len(in_ids):] for in_ids, out_ids in zip(inputs.input_ids, generated_ids)
-        ]
+        compiled = _vision_config.compiled
+        try:
+            new_tokens = _generate_new_tokens(model, inputs, _vision_config.device, max_new_tokens, compiled)
+        except Exception as e:
+            if not compiled:
+                raise
+            # torch.compile is lazy: Dynamo/Inductor/CUDA-graph errors surface
+            # on the first generate. Go eager for good and retry this batch.
+            print(f"[torch.compile failed ({type(e).__name__}: {e}); using eager mode]")
+            _disable_compile(model)
+            new_tokens = _generate_new_tokens(model, inputs, _vision_config.device, max_new_tokens)
+        del inputs
         
         # Decode
-        output_text = processor.batch_decode(
-            generated_ids_trimmed,
+        output_texts = processor.batch_decode(
+            new_tokens,
             skip_special_tokens=True,
             clean_up_tokenization_spaces=False
-        )[0]
+        )
         
-        return {
-            "success": True,
-            "analysis": output_text,
-            "model": f"Qwen3-VL-{_vision_config['local_model'].upper()}-Instruct",
-            "device": str(_vision_config["device"])
-        }
+        model_label = f"Qwen3-VL-{_vision_config.local_model.upper()}-Instruct"
+        return [
+            {
+                "success": True,
+                "analysis": output_text,
+                "model": model_label,
+                "device": str(_vision_config.device)
+            }
+            for output_text in output_texts
+        ]
     
     except Exception as e:
-        return {"error": f"Local model analysis failed: {str(e)}"}
+        return [{"error": f"Local model analysis failed: {str(e)}"}] * len(prompts)
+
+
+def _analyze_with_local_model(image_path: str, prompt: str, max_new_tokens: int = 512) -> Dict[str, Any]:
+    """Analyze image with local Qwen3-VL model"""
+    return _analyze_batch_with_local_model([image_path], [prompt], max_new_tokens)[0]
+
+
+def _encode_image_data_url(image_path: str) -> str:
+    """Base64-encode an image file into a data URL, reading it in chunks"""
+    encoded = bytearray(_PNG_DATA_URL_PREFIX)
+    with open(image_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(_B64_READ_CHUNK), b''):
+            encoded += _base64.b64encode(chunk)
+    return encoded.decode('ascii')
 
 
-def _analyze_with_api(image_path: str, prompt: str) -> Dict[str, Any]:
-    """Analyze image with OpenRouter API"""
+@lru_cache(maxsize=16)
+def _api_image_data_url(image_path: str, mtime_ns: int, size: int) -> str:
+    """Downscaled JPEG data URL for an image; keyed on mtime/size so edits miss the cache"""
     try:
-        # Read and encode image
-        with open(image_path, 'rb') as f:
-            image_data = base64.b64encode(f.read()).decode('utf-8')
+        from PIL import Image
+        
+        with Image.open(image_path) as img:
+            img = img.convert("RGB")
+            img.thumbnail((_API_IMAGE_MAX_EDGE, _API_IMAGE_MAX_EDGE), Image.LANCZOS)
+            buf = io.BytesIO()
+            img.save(buf, format="JPEG", quality=_API_JPEG_QUALITY, optimize=True)
+    except Exception:
+        # Pillow missing or unreadable format: send the original bytes
+        return _encode_image_data_url(image_path)
+    
+    return (_JPEG_DATA_URL_PREFIX + _base64.b64encode(buf.getbuffer())).decode('ascii')
+
+
+def _analyze_with_api(image_path: str, prompt: str, on_chunk=None, max_new_tokens: int = 512) -> Dict[str, Any]:
+    """Analyze image with OpenRouter API, serving repeats from cache"""
+    try:
+        key = _result_cache_key(image_path, prompt, max_new_tokens)
+    except OSError as e:
+        return {"error": f"API analysis failed: {str(e)}"}
+    
+    result = _result_cache_get(key)
+    if result is None:
+        result = _request_api_analysis(image_path, prompt, on_chunk, max_new_tokens)
+        _result_cache_put(key, result)
+    elif on_chunk:
+        on_chunk(result["analysis"])
+    return result
+
+
+def _iter_sse_content(response):
+    """Yield content deltas from an OpenRouter SSE chat completion stream"""
+    for line in response.iter_lines():
+        # Skip keep-alive blanks and ": OPENROUTER PROCESSING" comments
+        if not line.startswith(b"data: "):
+            continue
+        data = line[6:]
+        if data == b"[DONE]":
+            break
+        event = json.loads(data)
+        if "error" in event:
+            raise RuntimeError(event["error"].get("message", str(event["error"])))
+        choices = event.get("choices")
+        if choices:
+            content = choices[0].get("delta", {}).get("content")
+            if content:
+                yield content
+
+
+def _probe_api_model(model: str, headers: Dict[str, str]) -> Optional[int]:
+    """One-token request to check that a model route is live; returns the HTTP status"""
+    payload = {
+        "model": model,
+        "messages": [{"role": "user", "content": "ping"}],
+        "max_tokens": 1
+    }
+    try:
+        response = _get_http().post(
+            _OPENROUTER_CHAT_URL,
+            headers=headers,
+            json=payload,
+            timeout=_API_PROBE_TIMEOUT
+        )
+    except requests.exceptions.RequestException:
+        return None
+    return response.status_code
+
+
+def _run_api_probes(headers: Dict[str, str]) -> Optional[str]:
+    """Probe every candidate concurrently; returns the first live model, or None"""
+    pool = ThreadPoolExecutor(max_workers=len(_API_VISION_MODELS))
+    try:
+        futures = {pool.submit(_probe_api_model, m, headers): m for m in _API_VISION_MODELS}
+        for future in as_completed(futures):
+            status = future.result()
+            if status == 200:
+                return futures[future]
+            if status in (401, 402):
+                # Key or credit problem: every route will say the same
+                return None
+        return None
+    finally:
+        # Don't wait for slower probes once one has answered
+        pool.shutdown(wait=False)
+
+
+def _probe_preferred_model(headers: Dict[str, str]) -> Optional[str]:
+    """
+    Find the preferred API model, probing at most once at a time.
+    
+    The first caller runs the probes outside _probe_lock; concurrent callers
+    wait on its future instead of probing again. If every probe fails, no
+    probing is retried for _PROBE_RETRY_AFTER seconds.
+    """
+    global _probe_future, _probe_failed_at
+    
+    with _probe_lock:
+        if _vision_config.preferred_api_model is not None:
+            return _vision_config.preferred_api_model
+        future = _probe_future
+        if future is None:
+            if time.monotonic() - _probe_failed_at < _PROBE_RETRY_AFTER:
+                return None
+            future = _probe_future = Future()
+            owner = True
+        else:
+            owner = False
+    
+    if not owner:
+        return future.result()
+    
+    try:
+        model = _run_api_probes(headers)
+    except Exception:
+        model = None
+    with _probe_lock:
+        if model is not None:
+            _vision_config.preferred_api_model = model
+        else:
+            _probe_failed_at = time.monotonic()
+        _probe_future = None
+    future.set_result(model)
+    return model
+
+
+def _api_models_in_order(headers: Dict[str, str]) -> List[str]:
+    """
+    Candidate API models, preferred first.
+    
+    On first use all candidates are probed concurrently and the first to answer
+    becomes the preferred model, so a dead route never costs a full timeout.
+    """
+    preferred = _vision_config.preferred_api_model
+    if preferred is None:
+        preferred = _probe_preferred_model(headers)
+    
+    if preferred is None:
+        return list(_API_VISION_MODELS)
+    return [preferred] + [m for m in _API_VISION_MODELS if m != preferred]
+
+
+def _request_api_analysis(image_path: str, prompt: str, on_chunk=None, max_tokens: int = 512) -> Dict[str, Any]:
+    """Analyze image with OpenRouter API, streaming the response as it arrives"""
+    try:
+        # Downscale and encode image once for all fallback models
+        st = os.stat(image_path)
+        image_url = _api_image_data_url(os.path.abspath(image_path), st.st_mtime_ns, st.st_size)
         
         # Get API key
         from Agentic import TokenManager
         TokenManager.load_tokens()
         api_key = TokenManager.get_token()
         
-        # Prepare request
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        # Try Qwen3-VL first, fallback to GPT-4V
-        models_to_try = [
-            "qwen/qwen-2-vl-72b-instruct",  # Qwen3-VL on OpenRouter
-            "openai/gpt-4-vision-preview",   # GPT-4V fallback
-            "anthropic/claude-3-opus"        # Claude Vision fallback
-        ]
+        # Prepare request (Content-Type is set on the shared session)
+        headers = {"Authorization": f"Bearer {api_key}"}
         
-        for model in models_to_try:
+        # Fastest probed route first; the others only back it up on 404/5xx
+        for model in _api_models_in_order(headers):
             payload = {
                 "model": model,
                 "messages": [
@@ -268,7 +839,7 @@ def _analyze_with_api(image_path: str, prompt: str) -> Dict[str, Any]:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/png;base64,{image_data}"
+                                    "url": image_url
                                 }
                             },
                             {
@@ -277,28 +848,49 @@ def _analyze_with_api(image_path: str, prompt: str) -> Dict[str, Any]:
                             }
                         ]
                     }
-                ]
+                ],
+                "max_tokens": max_tokens,
+                "temperature": 0,
+                "stream": True
             }
             
+            parts = []
             try:
-                response = requests.post(
-                    "https://openrouter.ai/api/v1/chat/completions",
+                with _get_http().post(
+                    _OPENROUTER_CHAT_URL,
                     headers=headers,
                     json=payload,
-                    timeout=60
-                )
-                
-                if response.status_code == 200:
-                    data = response.json()
-                    analysis = data["choices"][0]["message"]["content"]
+                    timeout=_API_TIMEOUT,
+                    stream=True
+                ) as response:
+                    if response.status_code == 404 or response.status_code >= 500:
+                        continue  # Route unavailable: try next model
+                    if response.status_code != 200:
+                        # Auth, credits, bad request: another model won't help
+                        return {"error": f"API request failed ({response.status_code}): {response.text[:500]}"}
                     
-                    return {
-                        "success": True,
-                        "analysis": analysis,
-                        "model": model,
-                        "mode": "api"
-                    }
+                    for content in _iter_sse_content(response):
+                        parts.append(content)
+                        if on_chunk:
+                            on_chunk(content)
+                
+                _vision_config.preferred_api_model = model
+                return {
+                    "success": True,
+                    "analysis": "".join(parts),
+                    "model": model,
+                    "mode": "api"
+                }
+            except requests.exceptions.Timeout:
+                # A timeout means the model is slow, not dead; don't chain more waits
+                error = {"error": f"API request to {model} timed out"}
+                if parts:
+                    error["partial"] = "".join(parts)
+                return error
             except Exception as e:
+                if parts:
+                    # Output already streamed; switching models would garble it
+                    return {"error": f"API stream interrupted: {str(e)}", "partial": "".join(parts)}
                 continue  # Try next model
         
         return {"error": "All API models failed. Try local mode or check API key."}
@@ -307,21 +899,43 @@ def _analyze_with_api(image_path: str, prompt: str) -> Dict[str, Any]:
         return {"error": f"API analysis failed: {str(e)}"}
 
 
-def vision_analyze_ui(screenshot_path: str, prompt: str = None) -> Dict[str, Any]:
+def _parse_ui_sections(analysis_text: str) -> Tuple[List[str], List[str]]:
+    """
+    Collect bullet points under issue/problem and suggestion/recommendation
+    lines. A line mentioning either keyword switches section; other lines that
+    aren't bullets are ignored.
+    """
+    issues = []
+    suggestions = []
+    current = None
+    
+    for match in _UI_SECTION_RE.finditer(analysis_text):
+        kind = match.lastgroup
+        if kind == "issue":
+            current = issues
+        elif kind == "suggest":
+            current = suggestions
+        elif current is not None:
+            current.append(match.group("item").lstrip('-•* ').rstrip())
+    
+    return issues, suggestions
+
+
+def vision_analyze_ui(screenshot_path: str, prompt: str = None, on_chunk=None) -> Dict[str, Any]:
     """
     Analyze a UI screenshot using vision model.
     
     Args:
         screenshot_path: Path to screenshot
         prompt: Optional specific question. If None, does general UI analysis.
+        on_chunk: Optional callback receiving analysis text as it streams in
+            (API mode); local mode delivers the full text in one call.
     
     Returns:
         analysis: Detailed description of UI
         issues: List of potential problems
         suggestions: Improvement recommendations
     """
-    global _vision_config
-    
     # Check if file exists
     if not Path(screenshot_path).exists():
         return {"error": f"Screenshot not found: {screenshot_path}"}
@@ -345,10 +959,12 @@ def vision_analyze_ui(screenshot_path: str, prompt: str = None) -> Dict[str, Any
 Be specific and actionable in your analysis."""
     
     # Analyze based on mode
-    if _vision_config["mode"] == "local":
-        result = _analyze_with_local_model(screenshot_path, prompt)
+    if _vision_config.mode == "local":
+        result = _analyze_with_local_model(screenshot_path, prompt, _MAX_NEW_TOKENS["analyze_ui"])
+        if on_chunk and "error" not in result:
+            on_chunk(result["analysis"])
     else:
-        result = _analyze_with_api(screenshot_path, prompt)
+        result = _analyze_with_api(screenshot_path, prompt, on_chunk, _MAX_NEW_TOKENS["analyze_ui"])
     
     if "error" in result:
         return result
@@ -357,27 +973,7 @@ Be specific and actionable in your analysis."""
     analysis_text = result["analysis"]
     
     # Try to extract issues and suggestions
-    issues = []
-    suggestions = []
-    
-    # Simple parsing (can be improved)
-    lines = analysis_text.split('\n')
-    in_issues = False
-    in_suggestions = False
-    
-    for line in lines:
-        line = line.strip()
-        if 'issue' in line.lower() or 'problem' in line.lower():
-            in_issues = True
-            in_suggestions = False
-        elif 'suggest' in line.lower() or 'recommend' in line.lower():
-            in_suggestions = True
-            in_issues = False
-        elif line.startswith('-') or line.startswith('•') or line.startswith('*'):
-            if in_issues:
-                issues.append(line.lstrip('-•* '))
-            elif in_suggestions:
-                suggestions.append(line.lstrip('-•* '))
+    issues, suggestions = _parse_ui_sections(analysis_text)
     
     return {
         "screenshot_path": screenshot_path,
@@ -385,7 +981,49 @@ Be specific and actionable in your analysis."""
         "issues": issues if issues else ["No specific issues detected"],
         "suggestions": suggestions if suggestions else ["No specific suggestions"],
         "model": result.get("model", "unknown"),
-        "mode": _vision_config["mode"]
+        "mode": _vision_config.mode
+    }
+
+
+def vision_analyze_batch(screenshot_path: str, prompts: List[str]) -> Dict[str, Any]:
+    """
+    Ask several questions about one screenshot in a single pass.
+    
+    Local mode runs all prompts in one batched generate call; API mode sends
+    the requests concurrently.
+    
+    Args:
+        screenshot_path: Path to screenshot
+        prompts: Questions to ask about the screenshot
+    
+    Returns:
+        results: One {"prompt", "analysis"} or {"prompt", "error"} per prompt
+    """
+    if not Path(screenshot_path).exists():
+        return {"error": f"Screenshot not found: {screenshot_path}"}
+    if not prompts:
+        return {"error": "No prompts provided"}
+    
+    if _vision_config.mode == "local":
+        results = _analyze_batch_with_local_model([screenshot_path] * len(prompts), prompts)
+    else:
+        with ThreadPoolExecutor(max_workers=min(len(prompts), 4)) as pool:
+            results = list(pool.map(lambda p: _analyze_with_api(screenshot_path, p), prompts))
+    
+    entries = []
+    model = "unknown"
+    for prompt, result in zip(prompts, results):
+        if "error" in result:
+            entries.append({"prompt": prompt, "error": result["error"]})
+        else:
+            entries.append({"prompt": prompt, "analysis": result["analysis"]})
+            model = result.get("model", model)
+    
+    return {
+        "screenshot_path": screenshot_path,
+        "results": entries,
+        "model": model,
+        "mode": _vision_config.mode
     }
 
 
@@ -413,10 +1051,10 @@ If found, provide:
 
 Be specific and precise."""
     
-    if _vision_config["mode"] == "local":
-        result = _analyze_with_local_model(screenshot_path, prompt)
+    if _vision_config.mode == "local":
+        result = _analyze_with_local_model(screenshot_path, prompt, _MAX_NEW_TOKENS["find_element"])
     else:
-        result = _analyze_with_api(screenshot_path, prompt)
+        result = _analyze_with_api(screenshot_path, prompt, max_new_tokens=_MAX_NEW_TOKENS["find_element"])
     
     if "error" in result:
         return result
@@ -459,10 +1097,10 @@ For each element, report:
 
 Provide a summary at the end."""
     
-    if _vision_config["mode"] == "local":
-        result = _analyze_with_local_model(screenshot_path, prompt)
+    if _vision_config.mode == "local":
+        result = _analyze_with_local_model(screenshot_path, prompt, _MAX_NEW_TOKENS["verify_layout"])
     else:
-        result = _analyze_with_api(screenshot_path, prompt)
+        result = _analyze_with_api(screenshot_path, prompt, max_new_tokens=_MAX_NEW_TOKENS["verify_layout"])
     
     if "error" in result:
         return result
@@ -507,10 +1145,10 @@ def vision_accessibility_check(screenshot_path: str) -> Dict[str, Any]:
 
 Provide specific, actionable findings."""
     
-    if _vision_config["mode"] == "local":
-        result = _analyze_with_local_model(screenshot_path, prompt)
+    if _vision_config.mode == "local":
+        result = _analyze_with_local_model(screenshot_path, prompt, _MAX_NEW_TOKENS["accessibility"])
     else:
-        result = _analyze_with_api(screenshot_path, prompt)
+        result = _analyze_with_api(screenshot_path, prompt, max_new_tokens=_MAX_NEW_TOKENS["accessibility"])
     
     if "error" in result:
         return result
@@ -536,18 +1174,41 @@ def vision_compare_screenshots(screenshot1_path: str, screenshot2_path: str) ->
         differences: List of visual differences
         severity: "none", "minor", "major"
     """
+    # Byte-identical files (the common "no regression" case) need no model call
+    try:
+        identical = _image_digest(screenshot1_path) == _image_digest(screenshot2_path)
+    except OSError as e:
+        return {"error": f"Screenshot not found: {e.filename}"}
+    
+    if identical:
+        return {
+            "screenshot1": screenshot1_path,
+            "screenshot2": screenshot2_path,
+            "differences_found": False,
+            "baseline_description": None,
+            "current_description": None,
+            "note": "Screenshots are byte-identical; model analysis skipped",
+            "model": None
+        }
+    
     # For now, analyze each separately and compare
     # In future, could use a diff algorithm
     
     prompt1 = "Describe this UI in detail: layout, colors, text, buttons, forms, images."
     prompt2 = "Describe this UI in detail: layout, colors, text, buttons, forms, images."
     
-    if _vision_config["mode"] == "local":
-        result1 = _analyze_with_local_model(screenshot1_path, prompt1)
-        result2 = _analyze_with_local_model(screenshot2_path, prompt2)
+    if _vision_config.mode == "local":
+        # Both screenshots go through a single batched generate
+        result1, result2 = _analyze_batch_with_local_model(
+            [screenshot1_path, screenshot2_path], [prompt1, prompt2], _MAX_NEW_TOKENS["compare"]
+        )
     else:
-        result1 = _analyze_with_api(screenshot1_path, prompt1)
-        result2 = _analyze_with_api(screenshot2_path, prompt2)
+        # Overlap the two API round-trips
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            max_tokens = _MAX_NEW_TOKENS["compare"]
+            future1 = pool.submit(_analyze_with_api, screenshot1_path, prompt1, max_new_tokens=max_tokens)
+            future2 = pool.submit(_analyze_with_api, screenshot2_path, prompt2, max_new_tokens=max_tokens)
+            result1, result2 = future1.result(), future2.result()
     
     if "error" in result1:
         return result1